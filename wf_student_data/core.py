@@ -1,12 +1,60 @@
 import wf_student_data.postgres as postgres
 import wf_student_data.transparent_classroom as transparent_classroom
 import pandas as pd
+import numpy as np
+import concurrent.futures
 import datetime
+import functools
 import os
 import logging
 
 logger = logging.getLogger(__name__)
 
+@functools.lru_cache(maxsize=4)
+def get_pg_client(
+    dbname=None,
+    user=None,
+    password=None,
+    host=None,
+    port=None
+):
+    # Cache Postgres clients so repeated calls with the same connection
+    # specifications reuse a client instead of rebuilding one each time
+    return postgres.PostgresClient(
+        dbname=dbname,
+        user=user,
+        password=password,
+        host=host,
+        port=port
+    )
+
+@functools.lru_cache(maxsize=4)
+def get_tc_client(
+    username=None,
+    password=None,
+    api_token=None,
+    url_base=None
+):
+    # Cache Transparent Classroom clients so repeated calls with the same
+    # credentials reuse a client (and its API token) instead of
+    # re-authenticating each time
+    return transparent_classroom.TransparentClassroomClient(
+        username=username,
+        password=password,
+        api_token=api_token,
+        url_base=url_base
+    )
+
+def add_update_id(dataframe, update_id):
+    # Add the update ID as a new index level in place, avoiding the copies
+    # made by assign() followed by set_index(append=True)
+    dataframe.index = pd.MultiIndex.from_arrays(
+        [dataframe.index.get_level_values(level) for level in range(dataframe.index.nlevels)] +
+        [np.full(len(dataframe), update_id, dtype='int64')],
+        names=list(dataframe.index.names) + ['update_id']
+    )
+    return dataframe
+
 def update_tc_data(
     update_start=None,
     pg_client=None,
@@ -22,11 +70,13 @@ def update_tc_data(
     tc_url_base=None,
     progress_bar=False,
     notebook=False,
-    delay=None
+    delay=None,
+    requests_per_second=None,
+    max_workers=None
 ):
     # Initialize Postgres client
     if pg_client is None:
-        pg_client = postgres.PostgresClient(
+        pg_client = get_pg_client(
             dbname=pg_dbname,
             user=pg_user,
             password=pg_password,
@@ -35,7 +85,7 @@ def update_tc_data(
         )
     # Initialize Transparent Classroom client
     if tc_client is None:
-        tc_client = transparent_classroom.TransparentClassroomClient(
+        tc_client = get_tc_client(
             username=tc_username,
             password=tc_password,
             api_token=tc_api_token,
@@ -44,146 +94,109 @@ def update_tc_data(
     # Create connection to Postgres student database
     connection = pg_client.connect()
     try:
-        # Create new update in updates table
+        # Defer foreign key checks to commit so the bulk loads below aren't
+        # validated row by row, and skip the synchronous WAL flush at commit
+        # (losing an update to a crash just means rerunning it)
+        pg_client.defer_constraints(connection=connection)
+        pg_client.disable_synchronous_commit(connection=connection)
+        # Create new update in updates table, letting Postgres supply the
+        # start time unless the caller specifies one
         if update_start is None:
-            update_start = datetime.datetime.now(tz=datetime.timezone.utc)
-        data, description = pg_client.insert_row(
-            schema_name='tc',
-            table_name='updates',
-            insert_column_names=['update_start'],
-            insert_values=[update_start],
-            return_column_names=['update_id'],
-            connection=connection
-        )
-        update_id = data[0]
+            data, description = pg_client.insert_row(
+                schema_name='tc',
+                table_name='updates',
+                return_column_names=['update_id', 'update_start'],
+                connection=connection
+            )
+            update_id, update_start = data
+        else:
+            data, description = pg_client.insert_row(
+                schema_name='tc',
+                table_name='updates',
+                insert_column_names=['update_start'],
+                insert_values=[update_start],
+                return_column_names=['update_id'],
+                connection=connection
+            )
+            update_id = data[0]
         logger.info('Update with ID {} starting at {}'.format(
             update_id,
             update_start.isoformat()
         ))
-        # Fetch school data from Transparent Classroom
+        # Fetch school data from Transparent Classroom and insert it
         schools = tc_client.fetch_school_data()
         school_ids = schools.index
-        # Add update ID to school data
-        schools = (
-            schools
-            .assign(update_id=update_id)
-            .set_index('update_id', append=True)
-        )
-        # Insert school data into Postgres student database
-        pg_client.insert_dataframe(
+        schools = add_update_id(schools, update_id)
+        pg_client.copy_dataframe(
             dataframe=schools,
             schema_name='tc',
             table_name='schools',
             connection=connection
         )
-        # Fetch classroom data from Transparent Classroom
-        classrooms = tc_client.fetch_classroom_data(
-            school_ids=school_ids,
-            progress_bar=progress_bar,
-            notebook=notebook,
-            delay=delay
-        )
-        # Add update ID to classroom data
-        classrooms = (
-            classrooms
-            .assign(update_id=update_id)
-            .set_index('update_id', append=True)
-        )
-        # Insert classroom data into Postgres student database
-        pg_client.insert_dataframe(
-            dataframe=classrooms,
-            schema_name='tc',
-            table_name='classrooms',
-            connection=connection
-        )
-        # Fetch session data from Transparent Classroom
-        sessions = tc_client.fetch_session_data(
-            school_ids=school_ids,
-            progress_bar=progress_bar,
-            notebook=notebook,
-            delay=delay
-        )
-        session_ids = sessions.index
-        # Add update ID to session data
-        sessions = (
-            sessions
-            .assign(update_id=update_id)
-            .set_index('update_id', append=True)
-        )
-        # Insert session data into Postgres student database
-        pg_client.insert_dataframe(
-            dataframe=sessions,
-            schema_name='tc',
-            table_name='sessions',
-            connection=connection
-        )
-        # Fetch user data from Transparent Classroom
-        users = tc_client.fetch_user_data(
-                school_ids=school_ids,
-                progress_bar=progress_bar,
-                notebook=notebook,
-                delay=delay
-        )
-        # Add update ID to user data
-        users = (
-            users
-            .assign(update_id=update_id)
-            .set_index('update_id', append=True)
-        )
-        # Insert user data into Postgres student database
-        pg_client.insert_dataframe(
-            dataframe=users,
-            schema_name='tc',
-            table_name='users',
-            connection=connection
-        )
-        # Fetch child data and child-parent data from Transparent Classroom
-        children, children_parents = tc_client.fetch_child_data(
-            school_ids=school_ids,
-            progress_bar=progress_bar,
-            notebook=notebook,
-            delay=delay
-        )
-        # Add update ID to child data and child-parent_data
-        children = (
-            children
-            .assign(update_id=update_id)
-            .set_index('update_id', append=True)
-        )
-        children_parents = (
-            children_parents
-            .assign(update_id=update_id)
-            .set_index('update_id', append=True)
-        )
-        # Insert child data into Postgres student database
-        pg_client.insert_dataframe(
-            dataframe=children,
-            schema_name='tc',
-            table_name='children',
-            connection=connection
-        )
-        # Insert child-parent data into Postgres student database
-        pg_client.insert_dataframe(
-            dataframe=children_parents,
-            schema_name='tc',
-            table_name='children_parents',
-            connection=connection
-        )
-        # Fetch classroom-child data from Transparent Classroom
+        # Fetch classroom, session, user, and child data from Transparent
+        # Classroom concurrently (each depends only on the school IDs) and
+        # insert each table on the main thread as soon as its fetch
+        # completes. Constraint checks are deferred to commit, so insert
+        # order within the transaction doesn't matter
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            table_futures = dict()
+            for fetch_function, table_name in [
+                (tc_client.fetch_classroom_data, 'classrooms'),
+                (tc_client.fetch_session_data, 'sessions'),
+                (tc_client.fetch_user_data, 'users'),
+                (tc_client.fetch_child_data, 'children')
+            ]:
+                future = executor.submit(
+                    fetch_function,
+                    school_ids=school_ids,
+                    progress_bar=progress_bar,
+                    notebook=notebook,
+                    delay=delay,
+                    requests_per_second=requests_per_second,
+                    max_workers=max_workers
+                )
+                table_futures[future] = table_name
+            for future in concurrent.futures.as_completed(table_futures):
+                table_name = table_futures[future]
+                if table_name == 'children':
+                    # The child fetch yields both the child table and the
+                    # child-parent map
+                    children, children_parents = future.result()
+                    pg_client.copy_dataframe(
+                        dataframe=add_update_id(children, update_id),
+                        schema_name='tc',
+                        table_name='children',
+                        connection=connection
+                    )
+                    pg_client.copy_dataframe(
+                        dataframe=add_update_id(children_parents, update_id),
+                        schema_name='tc',
+                        table_name='children_parents',
+                        connection=connection
+                    )
+                else:
+                    dataframe = future.result()
+                    if table_name == 'sessions':
+                        session_ids = dataframe.index
+                    pg_client.copy_dataframe(
+                        dataframe=add_update_id(dataframe, update_id),
+                        schema_name='tc',
+                        table_name=table_name,
+                        connection=connection
+                    )
+        # Fetch classroom-child data from Transparent Classroom (depends on
+        # the session IDs, so it can't join the concurrent batch above) and
+        # insert it
         classrooms_children = tc_client.fetch_classroom_child_data(
             session_ids=session_ids,
             progress_bar=progress_bar,
             notebook=notebook,
-            delay=delay
-        )
-        # Add update ID to classroom-child data
-        classrooms_children = (
-            classrooms_children
-            .assign(update_id=update_id)
-            .set_index('update_id', append=True)
+            delay=delay,
+            requests_per_second=requests_per_second,
+            max_workers=max_workers
         )
-        # Insert classroom-child data into Postgres student database
-        pg_client.insert_dataframe(
+        classrooms_children = add_update_id(classrooms_children, update_id)
+        pg_client.copy_dataframe(
             dataframe=classrooms_children,
             schema_name='tc',
             table_name='classrooms_children',
@@ -208,12 +221,26 @@ def update_tc_data(
         # If there is an error anywhere, roll back all of the changes
         logger.error('Error occurred when updating TC data. Rolling back changes')
         connection.rollback()
-        connection.close()
+        pg_client.close_connection(connection)
         raise(err)
     # Commit changes and close connection
     connection.commit()
-    connection.close()
+    pg_client.close_connection(connection)
+
 
+# Data dict tables and whether to drop the dataframe index when inserting
+DATA_DICT_TABLES = [
+    ('ethnicity_categories', False),
+    ('gender_categories', False),
+    ('household_income_categories', False),
+    ('nps_categories', False),
+    ('boolean_categories', False),
+    ('ethnicity_map', True),
+    ('gender_map', False),
+    ('household_income_map', False),
+    ('nps_map', False),
+    ('boolean_map', False),
+]
 
 def populate_data_dict_from_local(
     pg_client=None,
@@ -223,159 +250,64 @@ def populate_data_dict_from_local(
     pg_host=None,
     pg_port=None,
     directory='.',
+    file_format='pickle',
     progress_bar=False,
     notebook=False
 ):
     # Initialize Postgres client
     if pg_client is None:
-        pg_client = postgres.PostgresClient(
+        pg_client = get_pg_client(
             dbname=pg_dbname,
             user=pg_user,
             password=pg_password,
             host=pg_host,
             port=pg_port
         )
+    if file_format == 'pickle':
+        read_function = pd.read_pickle
+        file_extension = 'pkl'
+    elif file_format == 'feather':
+        # Feather reads are faster and memory-mappable, but feather files
+        # store the index as ordinary columns, so there is no index to drop
+        read_function = pd.read_feather
+        file_extension = 'feather'
+    elif file_format == 'parquet':
+        # Parquet is columnar and fast to parse like feather, but to_parquet
+        # preserves a non-default index and read_parquet restores it, so the
+        # per-table drop_index flag applies just as it does for pickle
+        read_function = pd.read_parquet
+        file_extension = 'parquet'
+    else:
+        raise ValueError('File format \'{}\' not recognized'.format(file_format))
     # Create connection to Postgres student database
     connection = pg_client.connect()
-    try:
-        # Ethnicity categories
-        ## Fetch data from local
-        ethnicity_categories = pd.read_pickle(os.path.join(
-            directory,
-            'ethnicity_categories.pkl'
-        ))
-        ## Insert data into Postgres student database
-        pg_client.insert_dataframe(
-            dataframe=ethnicity_categories,
-            schema_name='data_dict',
-            table_name='ethnicity_categories',
-            connection=connection
-        )
-        # Gender categories
-        ## Fetch data from local
-        gender_categories = pd.read_pickle(os.path.join(
-            directory,
-            'gender_categories.pkl'
-        ))
-        ## Insert data into Postgres student database
-        pg_client.insert_dataframe(
-            dataframe=gender_categories,
-            schema_name='data_dict',
-            table_name='gender_categories',
-            connection=connection
-        )
-        # Household income categories
-        ## Fetch data from local
-        household_income_categories = pd.read_pickle(os.path.join(
-            directory,
-            'household_income_categories.pkl'
-        ))
-        ## Insert data into Postgres student database
-        pg_client.insert_dataframe(
-            dataframe=household_income_categories,
-            schema_name='data_dict',
-            table_name='household_income_categories',
-            connection=connection
-        )
-        # NPS categories
-        ## Fetch data from local
-        nps_categories = pd.read_pickle(os.path.join(
-            directory,
-            'nps_categories.pkl'
-        ))
-        ## Insert data into Postgres student database
-        pg_client.insert_dataframe(
-            dataframe=nps_categories,
-            schema_name='data_dict',
-            table_name='nps_categories',
-            connection=connection
-        )
-        # Boolean categories
-        ## Fetch data from local
-        boolean_categories = pd.read_pickle(os.path.join(
-            directory,
-            'boolean_categories.pkl'
-        ))
-        ## Insert data into Postgres student database
-        pg_client.insert_dataframe(
-            dataframe=boolean_categories,
-            schema_name='data_dict',
-            table_name='boolean_categories',
-            connection=connection
-        )
-        # Ethnicity map
-        ## Fetch data from local
-        ethnicity_map = pd.read_pickle(os.path.join(
-            directory,
-            'ethnicity_map.pkl'
-        ))
-        ## Insert data into Postgres student database
-        pg_client.insert_dataframe(
-            dataframe=ethnicity_map,
-            schema_name='data_dict',
-            table_name='ethnicity_map',
-            drop_index=True,
-            connection=connection
-        )
-        # Gender map
-        ## Fetch data from local
-        gender_map = pd.read_pickle(os.path.join(
-            directory,
-            'gender_map.pkl'
-        ))
-        ## Insert data into Postgres student database
-        pg_client.insert_dataframe(
-            dataframe=gender_map,
-            schema_name='data_dict',
-            table_name='gender_map',
-            connection=connection
-        )
-        # Household income map
-        ## Fetch data from local
-        household_income_map = pd.read_pickle(os.path.join(
-            directory,
-            'household_income_map.pkl'
-        ))
-        ## Insert data into Postgres student database
-        pg_client.insert_dataframe(
-            dataframe=household_income_map,
-            schema_name='data_dict',
-            table_name='household_income_map',
-            connection=connection
-        )
-        # NPS map
-        ## Fetch data from local
-        nps_map = pd.read_pickle(os.path.join(
-            directory,
-            'nps_map.pkl'
-        ))
-        ## Insert data into Postgres student database
-        pg_client.insert_dataframe(
-            dataframe=nps_map,
-            schema_name='data_dict',
-            table_name='nps_map',
-            connection=connection
-        )
-        # Boolean map
-        ## Fetch data from local
-        boolean_map = pd.read_pickle(os.path.join(
-            directory,
-            'boolean_map.pkl'
-        ))
-        ## Insert data into Postgres student database
-        pg_client.insert_dataframe(
-            dataframe=boolean_map,
-            schema_name='data_dict',
-            table_name='boolean_map',
-            connection=connection
-        )
-    except Exception as err:
-        # If there is an error anywhere, roll back all of the changes
-        logger.error('Error occurred when populating data dict. Rolling back changes')
-        connection.rollback()
-        connection.close()
-        raise(err)
+    # Prefetch all of the data dict files in parallel so each file can load
+    # while the previous table is being inserted
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        dataframe_futures = {
+            table_name: executor.submit(
+                read_function,
+                os.path.join(directory, '{}.{}'.format(table_name, file_extension))
+            )
+            for table_name, _ in DATA_DICT_TABLES
+        }
+        try:
+            # Insert data into Postgres student database
+            for table_name, drop_index in DATA_DICT_TABLES:
+                pg_client.copy_dataframe(
+                    dataframe=dataframe_futures[table_name].result(),
+                    schema_name='data_dict',
+                    table_name=table_name,
+                    drop_index=(True if file_format == 'feather' else drop_index),
+                    connection=connection
+                )
+        except Exception as err:
+            # If there is an error anywhere, roll back all of the changes
+            logger.error('Error occurred when populating data dict. Rolling back changes')
+            connection.rollback()
+            pg_client.close_connection(connection)
+            raise(err)
     # Commit changes and close connection
     connection.commit()
-    connection.close()
+    pg_client.close_connection(connection)
 
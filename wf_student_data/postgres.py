@@ -2,15 +2,39 @@ import wf_student_data.utils
 import pandas as pd
 import numpy as np
 import psycopg2
+import psycopg2.extras
+import psycopg2.pool
 import psycopg2.sql
-import tqdm
-import tqdm.notebook
 import datetime
+import functools
+import io
 import os
 import logging
 
 logger = logging.getLogger(__name__)
 
+def memoize_sql_composition(compose_function):
+    # Cache composed SQL objects keyed on the argument values (with lists
+    # converted to tuples) so repeated calls for the same table and columns
+    # don't rebuild the composition tree
+    cache = dict()
+    @functools.wraps(compose_function)
+    def wrapper(self, *args, **kwargs):
+        key = (
+            tuple(tuple(arg) if isinstance(arg, list) else arg for arg in args),
+            tuple(
+                (name, tuple(value) if isinstance(value, list) else value)
+                for name, value in sorted(kwargs.items())
+            )
+        )
+        try:
+            return cache[key]
+        except KeyError:
+            sql_object = compose_function(self, *args, **kwargs)
+            cache[key] = sql_object
+            return sql_object
+    return wrapper
+
 class PostgresClient:
     def __init__(
         self,
@@ -18,43 +42,56 @@ class PostgresClient:
         user=None,
         password=None,
         host=None,
-        port=None
+        port=None,
+        pool_minconn=1,
+        pool_maxconn=None
     ):
-        self.dbname = dbname
-        self.user = user
-        self.password = password
-        self.host = host
-        self.port = port
-        # Read connection specifications from environment variables if not explicitly specified
-        if self.dbname is None:
-            self.dbname = os.getenv('STUDENT_DATABASE_DBNAME')
-        if self.user is None:
-            self.user = os.getenv('STUDENT_DATABASE_USER')
-        if self.password is None:
-            self.password = os.getenv('STUDENT_DATABASE_PASSWORD')
-        if self.host is None:
-            self.host = os.getenv('STUDENT_DATABASE_HOST')
-        if self.port is None:
-            self.port = os.getenv('STUDENT_DATABASE_PORT')
-        # Populate connection arguments, leaving out any not specified (so psycopg2 reverts to default)
+        # Read connection specifications from environment variables if not
+        # explicitly specified, then populate connection arguments, leaving
+        # out any not specified (so psycopg2 reverts to default)
         self.connect_kwargs = dict()
-        if self.dbname is not None:
-            self.connect_kwargs['dbname'] = self.dbname
-        if self.user is not None:
-            self.connect_kwargs['user'] = self.user
-        if self.password is not None:
-            self.connect_kwargs['password'] = self.password
-        if self.host is not None:
-            self.connect_kwargs['host'] = self.host
-        if self.port is not None:
-            self.connect_kwargs['port'] = self.port
-    
+        for parameter_name, value, environment_variable_name in [
+            ('dbname', dbname, 'STUDENT_DATABASE_DBNAME'),
+            ('user', user, 'STUDENT_DATABASE_USER'),
+            ('password', password, 'STUDENT_DATABASE_PASSWORD'),
+            ('host', host, 'STUDENT_DATABASE_HOST'),
+            ('port', port, 'STUDENT_DATABASE_PORT')
+        ]:
+            if value is None:
+                value = os.getenv(environment_variable_name)
+            setattr(self, parameter_name, value)
+            if value is not None:
+                self.connect_kwargs[parameter_name] = value
+        # Connection pool is created lazily on first connect() if pooling is
+        # enabled via pool_maxconn
+        self.pool_minconn = pool_minconn
+        self.pool_maxconn = pool_maxconn
+        self.pool = None
+
     def connect(self):
-        # Connect to student database
+        # Connect to student database, drawing from the connection pool (and
+        # amortizing the TCP/TLS/auth handshake) if pooling is enabled
+        if self.pool_maxconn is not None:
+            if self.pool is None:
+                logger.info('Creating connection pool with connection specifications {}'.format(self.connect_kwargs))
+                self.pool = psycopg2.pool.ThreadedConnectionPool(
+                    self.pool_minconn,
+                    self.pool_maxconn,
+                    **self.connect_kwargs
+                )
+            return self.pool.getconn()
         logger.info('Connecting to student database with connection specifications {}'.format(self.connect_kwargs))
         connection = psycopg2.connect(**self.connect_kwargs)
         return connection
 
+    def close_connection(self, connection):
+        # Return the connection to the pool if pooling is enabled; otherwise
+        # close it outright
+        if self.pool is not None:
+            self.pool.putconn(connection)
+        else:
+            connection.close()
+
     def execute(
         self,
         sql_object,
@@ -65,7 +102,8 @@ class PostgresClient:
         existing_connection = True if connection is not None else False
         if not existing_connection:
             connection = self.connect()
-        logger.debug(sql_object.as_string(connection))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(sql_object.as_string(connection))
         with connection.cursor() as cur:
             cur.execute(sql_object, parameters)
             description = cur.description
@@ -75,7 +113,7 @@ class PostgresClient:
                 data_list = None
         if not existing_connection:
             connection.commit()
-            connection.close()
+            self.close_connection(connection)
         return data_list, description
 
     def executemany(
@@ -87,47 +125,86 @@ class PostgresClient:
         existing_connection = True if connection is not None else False
         if not existing_connection:
             connection = self.connect()
-        logger.debug(sql_object.as_string(connection))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(sql_object.as_string(connection))
         with connection.cursor() as cur:
             cur.executemany(sql_object, parameters_list)
         if not existing_connection:
             connection.commit()
-            connection.close()
+            self.close_connection(connection)
 
     def fetch_dataframe(
         self,
         schema_name,
         table_name,
         index_column_names=None,
+        select_column_names=None,
+        match_column_names=None,
+        match_values=None,
+        chunk_size=65536,
+        optimize_dtypes=False,
         connection=None
     ):
-        # Read data from student database
+        # Read data from student database. If column names are specified,
+        # only those columns are selected (so Postgres sends only the bytes
+        # we need); if match columns and values are specified, filtering
+        # happens server-side instead of on the fetched dataframe
         logger.info('Fetching \'{}\' table from \'{}\' schema'.format(
            table_name,
-           schema_name 
+           schema_name
         ))
-        data, description = self.select_rows(
+        sql_object = self.compose_select_sql(
             schema_name=schema_name,
             table_name=table_name,
-            select_column_names=None,
-            match_column_names=None,
-            match_values_list=None,
-            connection=connection
+            select_column_names=select_column_names,
+            match_column_names=match_column_names
         )
-        column_names = [descriptor.name for descriptor in description]
+        existing_connection = True if connection is not None else False
+        if not existing_connection:
+            connection = self.connect()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(sql_object.as_string(connection))
+        # Stream the rows through a server-side cursor so client memory is
+        # bounded by the chunk size rather than the table size and dataframe
+        # conversion overlaps with the network fetch
+        chunk_dataframes = list()
+        with connection.cursor(name='fetch_{}_{}'.format(schema_name, table_name)) as cur:
+            cur.itersize = chunk_size
+            cur.execute(sql_object, match_values)
+            column_names = None
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if column_names is None:
+                    column_names = [descriptor.name for descriptor in cur.description]
+                if len(rows) == 0:
+                    break
+                # Transpose the row tuples before handing them to pandas:
+                # constructing from columns lets pandas infer each dtype in
+                # one pass per column instead of scanning row by row
+                chunk_dataframes.append(pd.DataFrame(dict(zip(column_names, zip(*rows)))))
+        if not existing_connection:
+            connection.commit()
+            self.close_connection(connection)
         # Convert to dataframe
         logger.info('Converting to Pandas dataframe')
-        dataframe = pd.DataFrame(
-            data,
-            columns=column_names
-        )
+        if len(chunk_dataframes) > 0:
+            dataframe = pd.concat(chunk_dataframes, ignore_index=True)
+        else:
+            dataframe = pd.DataFrame(columns=column_names)
+        # If requested, shrink the in-memory footprint of the dataframe
+        if optimize_dtypes:
+            dataframe = optimize_dataframe_dtypes(dataframe)
         # If index columns are specified, set index of dataframe
         ## TODO: Automate this by inspecting primary key of table?
         if index_column_names is not None:
+            # Sort on the columns before building the index: sort_values runs
+            # a columnar lexsort on the underlying arrays, and set_index on
+            # already-sorted data skips the index-level re-sort that
+            # set_index().sort_index() would do
             dataframe = (
                 dataframe
+                .sort_values(index_column_names)
                 .set_index(index_column_names)
-                .sort_index()
             )
         return dataframe
 
@@ -137,11 +214,31 @@ class PostgresClient:
         schema_name,
         table_name,
         drop_index=False,
+        use_copy=True,
         connection=None
     ):
+        if len(dataframe) == 0:
+            logger.info('Dataframe is empty. Nothing to insert')
+            return
+        # COPY is one to two orders of magnitude faster than per-row INSERT
+        # for bulk loads, so route through it unless the caller opts out
+        if use_copy:
+            self.copy_dataframe(
+                dataframe=dataframe,
+                schema_name=schema_name,
+                table_name=table_name,
+                drop_index=drop_index,
+                connection=connection
+            )
+            return
         dataframe_noindex = dataframe.reset_index(drop=drop_index)
+        # Normalize missing values to None once per table (instead of leaving
+        # NaN/NaT for psycopg2 to trip over cell by cell) so they land as NULL
+        dataframe_noindex = dataframe_noindex.astype(object).where(dataframe_noindex.notna(), None)
         insert_column_names = dataframe_noindex.columns.tolist()
-        insert_values_list = dataframe_noindex.to_dict(orient='tight')['data']
+        # itertuples yields row tuples at C level, avoiding the nested
+        # dict/list materialization of to_dict(orient='tight')
+        insert_values_list = list(dataframe_noindex.itertuples(index=False, name=None))
         logger.info('Inserting data into \'{}\' table in \'{}\' schema'.format(
            table_name,
            schema_name 
@@ -155,6 +252,97 @@ class PostgresClient:
             connection=connection
         )
     
+    def defer_constraints(
+        self,
+        connection
+    ):
+        # Defer all deferrable constraint checks to transaction commit so bulk
+        # loads aren't validated row by row
+        logger.info('Deferring constraint checks until transaction commit')
+        self.execute(
+            sql_object=psycopg2.sql.SQL("SET CONSTRAINTS ALL DEFERRED"),
+            parameters=None,
+            connection=connection
+        )
+
+    def disable_synchronous_commit(
+        self,
+        connection
+    ):
+        # Relax durability for the current transaction only: a server crash
+        # can lose the transaction (which the caller would simply rerun) but
+        # cannot corrupt the database
+        logger.info('Disabling synchronous commit for the current transaction')
+        self.execute(
+            sql_object=psycopg2.sql.SQL("SET LOCAL synchronous_commit TO OFF"),
+            parameters=None,
+            connection=connection
+        )
+
+    def copy_dataframe(
+        self,
+        dataframe,
+        schema_name,
+        table_name,
+        drop_index=False,
+        chunk_size=10000,
+        connection=None
+    ):
+        if len(dataframe) == 0:
+            logger.info('Dataframe is empty. Nothing to copy')
+            return
+        dataframe_noindex = dataframe.reset_index(drop=drop_index)
+        copy_column_names = dataframe_noindex.columns.tolist()
+        # Pandas upcasts integer columns to float whenever they contain
+        # nulls, and COPY rejects a serialized '101.0' for an integer column
+        # (unlike INSERT parameters, which Postgres casts on assignment), so
+        # coerce float columns whose non-null values are all integral back to
+        # nullable integers before serializing
+        for copy_column_name in copy_column_names:
+            column = dataframe_noindex[copy_column_name]
+            if pd.api.types.is_float_dtype(column):
+                non_null_values = column.dropna()
+                if len(non_null_values) > 0 and (non_null_values % 1 == 0).all():
+                    dataframe_noindex[copy_column_name] = column.astype('Int64')
+        # Convert any list-valued cells to Postgres array literals so COPY can parse them
+        for copy_column_name in copy_column_names:
+            if dataframe_noindex[copy_column_name].apply(lambda value: isinstance(value, (list, tuple))).any():
+                dataframe_noindex[copy_column_name] = dataframe_noindex[copy_column_name].apply(format_array_literal)
+        logger.info('Copying data into \'{}\' table in \'{}\' schema'.format(
+           table_name,
+           schema_name
+        ))
+        sql_object = self.compose_copy_sql(
+            schema_name=schema_name,
+            table_name=table_name,
+            copy_column_names=copy_column_names
+        )
+        existing_connection = True if connection is not None else False
+        if not existing_connection:
+            connection = self.connect()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(sql_object.as_string(connection))
+        if chunk_size is None:
+            chunk_size = max(len(dataframe_noindex), 1)
+        # Serialize the dataframe to in-memory CSV buffers, one chunk at a
+        # time, and stream each chunk to the server with COPY, which avoids
+        # the per-row round trips of INSERT while capping buffer memory
+        with connection.cursor() as cur:
+            for chunk_start in range(0, len(dataframe_noindex), chunk_size):
+                buffer = io.StringIO()
+                dataframe_noindex.iloc[chunk_start:chunk_start + chunk_size].to_csv(
+                    buffer,
+                    sep='\t',
+                    header=False,
+                    index=False,
+                    na_rep='\\N'
+                )
+                buffer.seek(0)
+                cur.copy_expert(sql_object, buffer)
+        if not existing_connection:
+            connection.commit()
+            self.close_connection(connection)
+
     def update_records(
         self,
         schema_name,
@@ -165,18 +353,26 @@ class PostgresClient:
         update_time=None,
         connection=None
     ):
+        if len(update_values) == 0:
+            # An empty update is far more likely to be an upstream failure
+            # than a real signal that every record should be ended, so skip
+            # the fetch and comparison entirely rather than closing out the
+            # whole table
+            logger.warning('Update values dataframe is empty. Not updating records')
+            return
         if update_time is None:
             update_time = datetime.datetime.now(tz=datetime.timezone.utc)
+        # Fetch only the columns the comparison needs, and leave the frame
+        # unindexed so we don't build a record_id index just to discard it
         records = self.fetch_dataframe(
             schema_name=schema_name,
             table_name=table_name,
-            index_column_names=['record_id'],
+            select_column_names=['record_id', 'record_end'] + list(index_column_names) + list(value_column_names),
             connection=connection
         )
         current_records = (
             records
-            .loc[records['record_end'].isna()]
-            .reset_index()
+            .loc[records['record_end'].isna().to_numpy()]
             .set_index(index_column_names)
             .reindex(columns=['record_id'] + value_column_names)
         )
@@ -185,6 +381,11 @@ class PostgresClient:
             current=current_values,
             updates=update_values
         )
+        if len(new_rows) == 0 and len(deleted_rows) == 0 and len(changed_rows) == 0:
+            # Nothing new, changed, or deleted: the refresh is a no-op, so
+            # skip the end/start calls (and their SQL composition) entirely
+            logger.info('Update values match current records. Nothing to update')
+            return
         new_records = pd.concat([changed_rows, new_rows])
         end_records_value_indices = changed_rows.index.union(deleted_rows.index)
         end_record_ids = (
@@ -225,10 +426,10 @@ class PostgresClient:
             return
         if record_start is None:
             record_start = datetime.datetime.now(tz=datetime.timezone.utc)
-        insert_df = (
-            values
-            .assign(record_start=record_start)
-        )
+        # Shallow copy: adding the record_start column only needs a new
+        # column list, not a copy of every existing value column
+        insert_df = values.copy(deep=False)
+        insert_df['record_start'] = record_start
         self.insert_dataframe(
             dataframe=insert_df,
             schema_name=schema_name,
@@ -250,18 +451,17 @@ class PostgresClient:
             return
         if record_end is None:
             record_end = datetime.datetime.now(tz=datetime.timezone.utc)
-        match_column_names = ['record_id']
-        match_values_list = [[record_id] for record_id in record_ids]
-        update_column_names = ['record_end']
-        update_values_list=[[record_end] for _ in range(len(record_ids))]
-        self.update_rows(
-            schema_name=schema_name,
-            table_name=table_name,
-            update_column_names=update_column_names,
-            update_values_list=update_values_list,
-            match_column_names=match_column_names,
-            match_values_list=match_values_list,
-            return_column_names=None,
+        # Close all of the records in one statement (an index scan over the
+        # ANY array) instead of issuing one UPDATE per record ID
+        sql_object = psycopg2.sql.SQL("UPDATE {schema_name}.{table_name} SET {record_end_column_name} = %s WHERE {record_id_column_name} = ANY(%s)").format(
+            schema_name=psycopg2.sql.Identifier(schema_name),
+            table_name=psycopg2.sql.Identifier(table_name),
+            record_end_column_name=psycopg2.sql.Identifier('record_end'),
+            record_id_column_name=psycopg2.sql.Identifier('record_id')
+        )
+        self.execute(
+            sql_object=sql_object,
+            parameters=[record_end, list(record_ids)],
             connection=connection
         )
 
@@ -274,44 +474,37 @@ class PostgresClient:
         match_values_list=None,
         connection=None
     ):
-        if select_column_names is not None and len(select_column_names) == 0:
-            select_column_names = None
-        if match_column_names is not None and len(match_column_names) == 0:
-            match_column_names = None
-        if match_values_list is not None and len(match_values_list) == 0:
-            match_values_list = None
-        sql_object = self.compose_select_sql(
-            schema_name=schema_name,
-            table_name=table_name,
-            select_column_names=select_column_names,
-            match_column_names=match_column_names
-        )
-        if match_values_list is not None:
-            parameters_list = match_values_list
-            return_data = True
-            data_items = list()
-            description_items = list()
-            for parameters in parameters_list:
-                data_list, description = self.execute(
-                    sql_object=sql_object,
-                    parameters=parameters,
-                    return_data=return_data,
-                    connection=connection
+        select_column_names = none_if_empty(select_column_names)
+        match_column_names = none_if_empty(match_column_names)
+        match_values_list = none_if_empty(match_values_list)
+        if match_column_names is not None and match_values_list is not None:
+            # Match all of the value tuples in one set-oriented query rather
+            # than issuing one round trip per tuple
+            sql_object = psycopg2.sql.SQL(' ').join([
+                self.compose_select_sql(
+                    schema_name=schema_name,
+                    table_name=table_name,
+                    select_column_names=select_column_names
+                ),
+                psycopg2.sql.SQL("WHERE ({match_column_names}) IN %s").format(
+                    match_column_names=psycopg2.sql.SQL(', ').join([psycopg2.sql.Identifier(match_column_name) for match_column_name in match_column_names])
                 )
-                data_items.append(data_list[0])
-                description_items.append(description)
-            data = data_items
-            description = description_items[0]
+            ])
+            parameters = [tuple(tuple(match_values) for match_values in match_values_list)]
         else:
-            parameters=None
-            return_data=True
-            data_list, description = self.execute(
-                sql_object=sql_object,
-                parameters=parameters,
-                return_data=return_data,
-                connection=connection
+            sql_object = self.compose_select_sql(
+                schema_name=schema_name,
+                table_name=table_name,
+                select_column_names=select_column_names
             )
-            data=data_list
+            parameters = None
+        data_list, description = self.execute(
+            sql_object=sql_object,
+            parameters=parameters,
+            return_data=True,
+            connection=connection
+        )
+        data = data_list
         return data, description
 
     def select_row(
@@ -323,12 +516,9 @@ class PostgresClient:
         match_values=None,
         connection=None
     ):
-        if select_column_names is not None and len(select_column_names) == 0:
-            select_column_names = None
-        if match_column_names is not None and len(match_column_names) == 0:
-            match_column_names = None
-        if match_values is not None and len(match_values) == 0:
-            match_values = None
+        select_column_names = none_if_empty(select_column_names)
+        match_column_names = none_if_empty(match_column_names)
+        match_values = none_if_empty(match_values)
         if match_column_names is None or match_values is None:
             raise ValueError('Must specify columns and values to match when selecting single row')
         sql_object = self.compose_select_sql(
@@ -357,20 +547,18 @@ class PostgresClient:
         return_column_names=None,
         connection=None
     ):
-        if insert_column_names is not None and len(insert_column_names) == 0:
-            insert_column_names = None
-        if insert_values_list is not None and len(insert_values_list) == 0:
-            insert_values_list = None
-        if return_column_names is not None and len(return_column_names) == 0:
-            return_column_names = None
-        sql_object = self.compose_insert_sql(
-            schema_name=schema_name,
-            table_name=table_name,
-            insert_column_names=insert_column_names,
-            return_column_names=return_column_names
-        )
+        insert_column_names = none_if_empty(insert_column_names)
+        insert_values_list = none_if_empty(insert_values_list)
+        return_column_names = none_if_empty(return_column_names)
         parameters_list = insert_values_list
         if return_column_names is not None:
+            # RETURNING needs per-statement results, so execute row by row
+            sql_object = self.compose_insert_sql(
+                schema_name=schema_name,
+                table_name=table_name,
+                insert_column_names=insert_column_names,
+                return_column_names=return_column_names
+            )
             data_items = list()
             description_items = list()
             for parameters in parameters_list:
@@ -384,7 +572,38 @@ class PostgresClient:
                 description_items.append(description)
             data = data_items
             description = description_items[0]
+        elif insert_column_names is not None and parameters_list is not None:
+            # Collapse the row-by-row INSERTs into multi-row VALUES statements,
+            # which cuts the number of server round trips by the page size
+            sql_object = self.compose_insert_values_sql(
+                schema_name=schema_name,
+                table_name=table_name,
+                insert_column_names=insert_column_names
+            )
+            existing_connection = True if connection is not None else False
+            if not existing_connection:
+                connection = self.connect()
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(sql_object.as_string(connection))
+            with connection.cursor() as cur:
+                psycopg2.extras.execute_values(
+                    cur,
+                    sql_object.as_string(connection),
+                    parameters_list,
+                    page_size=1000
+                )
+            if not existing_connection:
+                connection.commit()
+                self.close_connection(connection)
+            data = None
+            description = None
         else:
+            sql_object = self.compose_insert_sql(
+                schema_name=schema_name,
+                table_name=table_name,
+                insert_column_names=insert_column_names,
+                return_column_names=return_column_names
+            )
             self.executemany(
                 sql_object=sql_object,
                 parameters_list=parameters_list,
@@ -403,12 +622,9 @@ class PostgresClient:
         return_column_names=None,
         connection=None
     ):
-        if insert_column_names is not None and len(insert_column_names) == 0:
-            insert_column_names = None
-        if insert_values is not None and len(insert_values) == 0:
-            insert_values = None
-        if return_column_names is not None and len(return_column_names) == 0:
-            return_column_names = None
+        insert_column_names = none_if_empty(insert_column_names)
+        insert_values = none_if_empty(insert_values)
+        return_column_names = none_if_empty(return_column_names)
         sql_object = self.compose_insert_sql(
             schema_name=schema_name,
             table_name=table_name,
@@ -443,12 +659,9 @@ class PostgresClient:
         return_column_names=None,
         connection=None
     ):
-        if match_column_names is not None and len(match_column_names) == 0:
-            match_column_names = None
-        if match_values_list is not None and len(match_values_list) == 0:
-            match_values_list = None
-        if return_column_names is not None and len(return_column_names) == 0:
-            return_column_names = None
+        match_column_names = none_if_empty(match_column_names)
+        match_values_list = none_if_empty(match_values_list)
+        return_column_names = none_if_empty(return_column_names)
         sql_object = self.compose_update_sql(
             schema_name=schema_name,
             table_name=table_name,
@@ -456,6 +669,9 @@ class PostgresClient:
             update_column_names=update_column_names,
             return_column_names=return_column_names
         )
+        if update_values_list is not None and len(update_values_list) == 0:
+            logger.info('Update values list is empty. Nothing to update')
+            return None, None
         if match_values_list is None:
             match_values_list = [[]*len(update_values_list)]
         if match_values_list is not None:
@@ -478,11 +694,24 @@ class PostgresClient:
             data = data_items
             description = description_items[0]
         else:
-            self.executemany(
-                sql_object=sql_object,
-                parameters_list=parameters_list,
-                connection=connection
-            )
+            # psycopg2 has no libpq pipeline mode, but execute_batch packs
+            # many UPDATEs into each round trip, which captures most of the
+            # same win over executemany
+            existing_connection = True if connection is not None else False
+            if not existing_connection:
+                connection = self.connect()
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(sql_object.as_string(connection))
+            with connection.cursor() as cur:
+                psycopg2.extras.execute_batch(
+                    cur,
+                    sql_object,
+                    parameters_list,
+                    page_size=500
+                )
+            if not existing_connection:
+                connection.commit()
+                self.close_connection(connection)
             data = None
             description = None
         return data, description
@@ -498,12 +727,9 @@ class PostgresClient:
         return_column_names=None,
         connection=None
     ):
-        if match_column_names is not None and len(match_column_names) == 0:
-            match_column_names = None
-        if match_values is not None and len(match_values) == 0:
-            match_values = None
-        if return_column_names is not None and len(return_column_names) == 0:
-            return_column_names = None
+        match_column_names = none_if_empty(match_column_names)
+        match_values = none_if_empty(match_values)
+        return_column_names = none_if_empty(return_column_names)
         if match_column_names is None or match_values is None:
             raise ValueError('Must specify columns and values to match when updating single row')
         sql_object = self.compose_update_sql(
@@ -542,12 +768,9 @@ class PostgresClient:
         return_column_names=None,
         connection=None
     ):
-        if match_column_names is not None and len(match_column_names) == 0:
-            match_column_names = None
-        if match_values_list is not None and len(match_values_list) == 0:
-            match_values_list = None
-        if return_column_names is not None and len(return_column_names) == 0:
-            return_column_names = None
+        match_column_names = none_if_empty(match_column_names)
+        match_values_list = none_if_empty(match_values_list)
+        return_column_names = none_if_empty(return_column_names)
         sql_object = self.compose_delete_sql(
             schema_name=schema_name,
             table_name=table_name,
@@ -610,12 +833,9 @@ class PostgresClient:
         return_column_names=None,
         connection=None
     ):
-        if match_column_names is not None and len(match_column_names) == 0:
-            match_column_names = None
-        if match_values is not None and len(match_values) == 0:
-            match_values = None
-        if return_column_names is not None and len(return_column_names) == 0:
-            return_column_names = None
+        match_column_names = none_if_empty(match_column_names)
+        match_values = none_if_empty(match_values)
+        return_column_names = none_if_empty(return_column_names)
         if match_column_names is None or match_values is None:
             raise ValueError('Must specify columns and values to match when deleting single row')
         sql_object = self.compose_delete_sql(
@@ -641,6 +861,7 @@ class PostgresClient:
             data = None
         return data, description
 
+    @memoize_sql_composition
     def compose_select_sql(
         self,
         schema_name,
@@ -678,6 +899,7 @@ class PostgresClient:
             ])
         return sql_object
 
+    @memoize_sql_composition
     def compose_insert_sql(
         self,
         schema_name,
@@ -711,6 +933,37 @@ class PostgresClient:
             ])
         return sql_object
 
+    @memoize_sql_composition
+    def compose_insert_values_sql(
+        self,
+        schema_name,
+        table_name,
+        insert_column_names
+    ):
+        # Multi-row template for psycopg2.extras.execute_values, which fills
+        # in the VALUES %s placeholder with pages of rows
+        sql_object = psycopg2.sql.SQL("INSERT INTO {schema_name}.{table_name} ({insert_column_names}) VALUES %s").format(
+            schema_name=psycopg2.sql.Identifier(schema_name),
+            table_name=psycopg2.sql.Identifier(table_name),
+            insert_column_names = psycopg2.sql.SQL(', ').join([psycopg2.sql.Identifier(column_name) for column_name in insert_column_names])
+        )
+        return sql_object
+
+    @memoize_sql_composition
+    def compose_copy_sql(
+        self,
+        schema_name,
+        table_name,
+        copy_column_names
+    ):
+        sql_object = psycopg2.sql.SQL("COPY {schema_name}.{table_name} ({copy_column_names}) FROM STDIN WITH (FORMAT CSV, DELIMITER E'\\t', NULL '\\N')").format(
+            schema_name=psycopg2.sql.Identifier(schema_name),
+            table_name=psycopg2.sql.Identifier(table_name),
+            copy_column_names=psycopg2.sql.SQL(', ').join([psycopg2.sql.Identifier(copy_column_name) for copy_column_name in copy_column_names])
+        )
+        return sql_object
+
+    @memoize_sql_composition
     def compose_update_sql(
         self,
         schema_name,
@@ -747,6 +1000,7 @@ class PostgresClient:
             ])
         return sql_object
     
+    @memoize_sql_composition
     def compose_delete_sql(
         self,
         schema_name,
@@ -775,3 +1029,41 @@ class PostgresClient:
             ])
         return sql_object
 
+def none_if_empty(value):
+    # Normalize empty column/value lists to None so the row-method branches
+    # only ever have to test for None
+    if value is not None and len(value) == 0:
+        return None
+    return value
+
+def optimize_dataframe_dtypes(dataframe):
+    # Shrink the memory footprint of a fetched dataframe: downcast numeric
+    # columns to the smallest sufficient type and convert low-cardinality
+    # text columns (fewer distinct values than half the row count) to
+    # categoricals, which store one copy of each distinct string plus
+    # integer codes
+    for column_name in dataframe.columns:
+        column = dataframe[column_name]
+        if pd.api.types.is_integer_dtype(column):
+            dataframe[column_name] = pd.to_numeric(column, downcast='integer')
+        elif pd.api.types.is_float_dtype(column):
+            dataframe[column_name] = pd.to_numeric(column, downcast='float')
+        elif (pd.api.types.is_object_dtype(column) or pd.api.types.is_string_dtype(column)) and len(column) > 0:
+            try:
+                num_unique = column.nunique()
+            except TypeError:
+                # Unhashable cell values (e.g., lists from array columns)
+                continue
+            if num_unique < 0.5 * len(column):
+                dataframe[column_name] = column.astype('category')
+    return dataframe
+
+def format_array_literal(value):
+    if value is None:
+        return None
+    if not isinstance(value, (list, tuple)):
+        return value
+    return '{' + ','.join(
+        '"' + str(element).replace('\\', '\\\\').replace('"', '\\"') + '"'
+        for element in value
+    ) + '}'
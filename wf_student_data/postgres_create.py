@@ -9,7 +9,7 @@ CREATE SCHEMA tc;
 
 CREATE TABLE tc.updates (
     update_id       SERIAL,
-    update_start    timestamp with time zone,
+    update_start    timestamp with time zone DEFAULT now(),
     update_end      timestamp with time zone,
     PRIMARY KEY (update_id)
 );
@@ -22,7 +22,7 @@ CREATE TABLE tc.schools (
     phone       text,
     time_zone   text,
     PRIMARY KEY (update_id, school_id),
-    FOREIGN KEY (update_id) REFERENCES tc.updates(update_id)
+    FOREIGN KEY (update_id) REFERENCES tc.updates(update_id) DEFERRABLE INITIALLY IMMEDIATE
 );
 
 CREATE TABLE tc.sessions (
@@ -36,8 +36,8 @@ CREATE TABLE tc.sessions (
     inactive    boolean,
     children    integer,
     PRIMARY KEY (update_id, school_id, session_id),
-    FOREIGN KEY (update_id) REFERENCES tc.updates(update_id),
-    FOREIGN KEY (update_id, school_id) REFERENCES tc.schools(update_id, school_id)
+    FOREIGN KEY (update_id) REFERENCES tc.updates(update_id) DEFERRABLE INITIALLY IMMEDIATE,
+    FOREIGN KEY (update_id, school_id) REFERENCES tc.schools(update_id, school_id) DEFERRABLE INITIALLY IMMEDIATE
 );
 
 CREATE TABLE tc.classrooms (
@@ -49,8 +49,8 @@ CREATE TABLE tc.classrooms (
     level           text,
     active          boolean,
     PRIMARY KEY (update_id, school_id, classroom_id),
-    FOREIGN KEY (update_id) REFERENCES tc.updates(update_id),
-    FOREIGN KEY (update_id, school_id) REFERENCES tc.schools(update_id, school_id)
+    FOREIGN KEY (update_id) REFERENCES tc.updates(update_id) DEFERRABLE INITIALLY IMMEDIATE,
+    FOREIGN KEY (update_id, school_id) REFERENCES tc.schools(update_id, school_id) DEFERRABLE INITIALLY IMMEDIATE
 );
 
 CREATE TABLE tc.users (
@@ -64,8 +64,8 @@ CREATE TABLE tc.users (
     inactive    boolean,
     type        text,
     PRIMARY KEY (update_id, school_id, user_id),
-    FOREIGN KEY (update_id) REFERENCES tc.updates(update_id),
-    FOREIGN KEY (update_id, school_id) REFERENCES tc.schools(update_id, school_id)
+    FOREIGN KEY (update_id) REFERENCES tc.updates(update_id) DEFERRABLE INITIALLY IMMEDIATE,
+    FOREIGN KEY (update_id, school_id) REFERENCES tc.schools(update_id, school_id) DEFERRABLE INITIALLY IMMEDIATE
 );
 
 CREATE TABLE tc.children (
@@ -88,8 +88,8 @@ CREATE TABLE tc.children (
     exit_reason         text,
     current_child       boolean,
     PRIMARY KEY (update_id, school_id, child_id),
-    FOREIGN KEY (update_id) REFERENCES tc.updates(update_id),
-    FOREIGN KEY (update_id, school_id) REFERENCES tc.schools(update_id, school_id)
+    FOREIGN KEY (update_id) REFERENCES tc.updates(update_id) DEFERRABLE INITIALLY IMMEDIATE,
+    FOREIGN KEY (update_id, school_id) REFERENCES tc.schools(update_id, school_id) DEFERRABLE INITIALLY IMMEDIATE
 );
 
 CREATE TABLE tc.children_parents (
@@ -98,9 +98,9 @@ CREATE TABLE tc.children_parents (
     child_id    integer,
     parent_id   integer,
     PRIMARY KEY (update_id, school_id, child_id, parent_id),
-    FOREIGN KEY (update_id) REFERENCES tc.updates(update_id),
-    FOREIGN KEY (update_id, school_id, child_id) REFERENCES tc.children(update_id, school_id, child_id),
-    FOREIGN KEY (update_id, school_id, parent_id) REFERENCES tc.users(update_id, school_id, user_id)
+    FOREIGN KEY (update_id) REFERENCES tc.updates(update_id) DEFERRABLE INITIALLY IMMEDIATE,
+    FOREIGN KEY (update_id, school_id, child_id) REFERENCES tc.children(update_id, school_id, child_id) DEFERRABLE INITIALLY IMMEDIATE,
+    FOREIGN KEY (update_id, school_id, parent_id) REFERENCES tc.users(update_id, school_id, user_id) DEFERRABLE INITIALLY IMMEDIATE
 );
 
 CREATE TABLE tc.classrooms_children (
@@ -110,10 +110,10 @@ CREATE TABLE tc.classrooms_children (
     classroom_id    integer,
     child_id        integer,
     PRIMARY KEY (update_id, school_id, session_id, classroom_id, child_id),
-    FOREIGN KEY (update_id) REFERENCES tc.updates(update_id),
-    FOREIGN KEY (update_id, school_id, session_id) REFERENCES tc.sessions(update_id, school_id, session_id),
-    FOREIGN KEY (update_id, school_id, classroom_id) REFERENCES tc.classrooms(update_id, school_id, classroom_id),
-    FOREIGN KEY (update_id, school_id, child_id) REFERENCES tc.children(update_id, school_id, child_id)
+    FOREIGN KEY (update_id) REFERENCES tc.updates(update_id) DEFERRABLE INITIALLY IMMEDIATE,
+    FOREIGN KEY (update_id, school_id, session_id) REFERENCES tc.sessions(update_id, school_id, session_id) DEFERRABLE INITIALLY IMMEDIATE,
+    FOREIGN KEY (update_id, school_id, classroom_id) REFERENCES tc.classrooms(update_id, school_id, classroom_id) DEFERRABLE INITIALLY IMMEDIATE,
+    FOREIGN KEY (update_id, school_id, child_id) REFERENCES tc.children(update_id, school_id, child_id) DEFERRABLE INITIALLY IMMEDIATE
 );
 
 CREATE SCHEMA data_dict;
@@ -158,35 +158,35 @@ CREATE TABLE data_dict.ethnicity_map (
     ethnicity_response  text,
     ethnicity_category  text,
     PRIMARY KEY (ethnicity_map_id),
-    FOREIGN KEY (ethnicity_category) REFERENCES data_dict.ethnicity_categories(ethnicity_category)
+    FOREIGN KEY (ethnicity_category) REFERENCES data_dict.ethnicity_categories(ethnicity_category) DEFERRABLE INITIALLY IMMEDIATE
 );
 
 CREATE TABLE data_dict.gender_map (
     gender_response  text,
     gender_category  text,
     PRIMARY KEY (gender_response),
-    FOREIGN KEY (gender_category) REFERENCES data_dict.gender_categories(gender_category)
+    FOREIGN KEY (gender_category) REFERENCES data_dict.gender_categories(gender_category) DEFERRABLE INITIALLY IMMEDIATE
 );
 
 CREATE TABLE data_dict.household_income_map (
     household_income_response  text,
     household_income_category  text,
     PRIMARY KEY (household_income_response),
-    FOREIGN KEY (household_income_category) REFERENCES data_dict.household_income_categories(household_income_category)
+    FOREIGN KEY (household_income_category) REFERENCES data_dict.household_income_categories(household_income_category) DEFERRABLE INITIALLY IMMEDIATE
 );
 
 CREATE TABLE data_dict.nps_map (
     nps_response  integer,
     nps_category  text,
     PRIMARY KEY (nps_response),
-    FOREIGN KEY (nps_category) REFERENCES data_dict.nps_categories(nps_category)
+    FOREIGN KEY (nps_category) REFERENCES data_dict.nps_categories(nps_category) DEFERRABLE INITIALLY IMMEDIATE
 );
 
 CREATE TABLE data_dict.boolean_map (
     boolean_response  text,
     boolean_category  boolean,
     PRIMARY KEY (boolean_response),
-    FOREIGN KEY (boolean_category) REFERENCES data_dict.boolean_categories(boolean_category)
+    FOREIGN KEY (boolean_category) REFERENCES data_dict.boolean_categories(boolean_category) DEFERRABLE INITIALLY IMMEDIATE
 );
 
 """
@@ -4,6 +4,8 @@ import pandas as pd
 import numpy as np
 import tqdm
 import tqdm.notebook
+import concurrent.futures
+import threading
 import json
 import time
 import os
@@ -11,6 +13,67 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+class TransparentClassroomRateLimitError(Exception):
+    '''
+    Raised when the Transparent Classroom API reports that we have exceeded its rate limit
+    '''
+    pass
+
+class RateLimiter:
+    '''
+    Token-bucket rate limiter, safe to share across threads
+
+    The request rate adapts using additive increase/multiplicative decrease:
+    each successful request nudges the rate back up toward the specified
+    maximum, and each rate limit error from the API cuts the rate in half
+    '''
+    def __init__(
+        self,
+        requests_per_second,
+        additive_increase=None,
+        multiplicative_decrease=0.5,
+        minimum_requests_per_second=None
+    ):
+        self.max_requests_per_second = requests_per_second
+        self.requests_per_second = requests_per_second
+        if additive_increase is None:
+            additive_increase = requests_per_second/20
+        self.additive_increase = additive_increase
+        self.multiplicative_decrease = multiplicative_decrease
+        # Floor on the adaptive rate so sustained rate limit errors slow
+        # requests down but can never stretch the wait intervals without bound
+        if minimum_requests_per_second is None:
+            minimum_requests_per_second = requests_per_second/100
+        self.minimum_requests_per_second = minimum_requests_per_second
+        self.lock = threading.Lock()
+        self.next_request_time = 0.0
+
+    def wait(self):
+        with self.lock:
+            interval = 1.0/self.requests_per_second
+            now = time.monotonic()
+            wait_time = self.next_request_time - now
+            self.next_request_time = max(now, self.next_request_time) + interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+    def increase_rate(self):
+        with self.lock:
+            self.requests_per_second = min(
+                self.max_requests_per_second,
+                self.requests_per_second + self.additive_increase
+            )
+
+    def decrease_rate(self):
+        with self.lock:
+            self.requests_per_second = max(
+                self.minimum_requests_per_second,
+                self.requests_per_second*self.multiplicative_decrease
+            )
+        logger.warning('Rate limit error from TC API. Reducing request rate to {:.2f} requests per second'.format(
+            self.requests_per_second
+        ))
+
 class TransparentClassroomClient:
     def __init__(
         self,
@@ -25,6 +88,22 @@ class TransparentClassroomClient:
         self.url_base = url_base
         if self.url_base is None:
             self.url_base = 'https://www.transparentclassroom.com/api/v1/'
+        # Reuse one session for all requests so the TCP/TLS handshake is paid
+        # once per pooled connection rather than once per request. Sized to
+        # accommodate concurrent fetches from the thread pool (sessions are
+        # thread-safe for GETs as long as each call passes its own headers)
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=32,
+            pool_maxsize=32
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # Rate limiter is shared across all fetches made through this client
+        # (created lazily on the first rate-limited fetch) so that concurrent
+        # fetchers collectively stay under the requested cap
+        self.rate_limiter = None
+        self.rate_limiter_lock = threading.Lock()
         if self.api_token is None:
             self.api_token = os.getenv('TRANSPARENT_CLASSROOM_API_TOKEN')
         if self.api_token is None:
@@ -49,7 +128,8 @@ class TransparentClassroomClient:
         params=None,
         school_id=None,
         masquerade_id=None,
-        auth=None
+        auth=None,
+        retries=4
     ):
         headers = dict()
         if self.api_token is not None:
@@ -58,12 +138,33 @@ class TransparentClassroomClient:
             headers['X-TransparentClassroomSchoolId'] = str(school_id)
         if masquerade_id is not None:
             headers['X-TransparentClassroomMasqueradeId'] = str(masquerade_id)
-        r = requests.get(
-            '{}{}'.format(self.url_base, endpoint),
-            params=params,
-            headers=headers,
-            auth=auth
-        )
+        # Retry transient failures (network errors and 5xx responses) with
+        # exponential backoff before giving up
+        backoff = 1.0
+        for attempt in range(retries + 1):
+            try:
+                r = self.session.get(
+                    '{}{}'.format(self.url_base, endpoint),
+                    params=params,
+                    headers=headers,
+                    auth=auth
+                )
+            except requests.exceptions.RequestException as err:
+                if attempt >= retries:
+                    raise
+                logger.warning('Transparent Classroom request failed ({}). Retrying in {:.0f} seconds'.format(
+                    err,
+                    backoff
+                ))
+            else:
+                if r.status_code < 500 or attempt >= retries:
+                    break
+                logger.warning('Transparent Classroom request returned status code {}. Retrying in {:.0f} seconds'.format(
+                    r.status_code,
+                    backoff
+                ))
+            time.sleep(backoff)
+            backoff *= 2
         if r.status_code != 200:
             error_message = 'Transparent Classroom request returned status code {}'.format(r.status_code)
             # Try to add more detailed error info from HTTP response
@@ -72,15 +173,96 @@ class TransparentClassroomClient:
                     error_message += '\n{}'.format(json.dumps(r.json().get('errors'), indent=2))
             except:
                 pass
+            if r.status_code == 429:
+                raise TransparentClassroomRateLimitError(error_message)
             raise Exception(error_message)
         return r.json()
 
+    def fetch_data_for_ids(
+        self,
+        fetch_function,
+        ids,
+        progress_bar=False,
+        notebook=False,
+        delay=None,
+        requests_per_second=None,
+        max_workers=None
+    ):
+        # Iterate over the given IDs, applying the fetch function to each one
+        # and returning the results in order. If max_workers is specified, the
+        # fetches are fanned out to a bounded thread pool; a shared token-bucket
+        # rate limiter caps the overall request rate if requests_per_second is
+        # specified
+        if delay is not None:
+            logger.info('Using delay of {} seconds between requests to avoid rate limit errors from TC API'.format(
+                delay
+            ))
+        if requests_per_second is not None:
+            logger.info('Limiting requests to {} per second to avoid rate limit errors from TC API'.format(
+                requests_per_second
+            ))
+            # Use the client-wide limiter so the cap is global: update_tc_data
+            # runs several fetchers concurrently, and per-call limiters would
+            # multiply the permitted aggregate rate by the number of fetchers
+            with self.rate_limiter_lock:
+                if self.rate_limiter is None:
+                    self.rate_limiter = RateLimiter(requests_per_second)
+            rate_limiter = self.rate_limiter
+        else:
+            rate_limiter = None
+        def fetch_id(id, rate_limit_retries=8):
+            while True:
+                if rate_limiter is not None:
+                    rate_limiter.wait()
+                try:
+                    result = fetch_function(id)
+                except TransparentClassroomRateLimitError:
+                    # Back off and retry if the API reports that we have
+                    # exceeded its rate limit, but only a bounded number of
+                    # times so a persistently throttled run fails with an
+                    # error instead of retrying forever
+                    if rate_limiter is not None and rate_limit_retries > 0:
+                        rate_limit_retries -= 1
+                        rate_limiter.decrease_rate()
+                        continue
+                    raise
+                if rate_limiter is not None:
+                    rate_limiter.increase_rate()
+                # Optional delay to avoid rate limit errors from TC API
+                if delay is not None:
+                    time.sleep(delay)
+                return result
+        if max_workers is not None and max_workers > 1:
+            logger.info('Fanning requests out to {} workers'.format(max_workers))
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                result_iterator = executor.map(fetch_id, ids)
+                # Wrap the iterator in the appropriate progress bar if requested
+                if progress_bar:
+                    if notebook:
+                        result_iterator = tqdm.notebook.tqdm(result_iterator, total=len(ids))
+                    else:
+                        result_iterator = tqdm.tqdm(result_iterator, total=len(ids))
+                results = list(result_iterator)
+        else:
+            # Wrap the iterator in the appropriate progress bar if requested
+            if progress_bar:
+                if notebook:
+                    id_iterator = tqdm.notebook.tqdm(ids)
+                else:
+                    id_iterator = tqdm.tqdm(ids)
+            else:
+                id_iterator = ids
+            results = [fetch_id(id) for id in id_iterator]
+        return results
+
     def fetch_classroom_child_data(
         self,
         session_ids=None,
         progress_bar=False,
         notebook=False,
-        delay = None
+        delay=None,
+        requests_per_second=None,
+        max_workers=None
     ):
         # If session IDs are not specified, fetch all session IDs
         # Each session ID is a tuple consisting of a TC school ID and a TC session ID
@@ -89,31 +271,21 @@ class TransparentClassroomClient:
                 progress_bar=progress_bar,
                 notebook=notebook
             )
-        # Wrap the iterator in the appropriate progress bar if requested
-        if progress_bar:
-            if notebook:
-                session_id_iterator = tqdm.notebook.tqdm(session_ids)
-            else:
-                session_id_iterator = tqdm.tqdm(session_ids)
-        else:
-            session_id_iterator = session_ids
-        classrooms_children_dfs = list()
         logger.info('Fetching classroom-child mapping from Transparent Classroom for {} sessions'.format(
             len(session_ids)
         ))
-        if delay is not None:
-            logger.info('Using delay of {} seconds between requests to avoid rate limit errors from TC API'.format(
-                delay
-            ))
-        for school_id, session_id in session_id_iterator:
-            classrooms_children_session = self.fetch_classroom_child_data_session(
-                school_id=school_id,
-                session_id=session_id
-            )
-            classrooms_children_dfs.append(classrooms_children_session)
-            # Optional delay to avoid rate limit errors from TC API
-            if delay is not None:
-                time.sleep(delay)
+        classrooms_children_dfs = self.fetch_data_for_ids(
+            fetch_function=lambda session_id: self.fetch_classroom_child_data_session(
+                school_id=session_id[0],
+                session_id=session_id[1]
+            ),
+            ids=session_ids,
+            progress_bar=progress_bar,
+            notebook=notebook,
+            delay=delay,
+            requests_per_second=requests_per_second,
+            max_workers=max_workers
+        )
         classrooms_children = (
             pd.concat(classrooms_children_dfs)
             .sort_index()
@@ -168,39 +340,31 @@ class TransparentClassroomClient:
         school_ids=None,
         progress_bar=False,
         notebook=False,
-        delay = None
+        delay=None,
+        requests_per_second=None,
+        max_workers=None
     ):
         # If school IDs are not specified, fetch all school IDs
         if school_ids is None:
             school_ids = self.fetch_school_ids()
-        # Wrap the iterator in the appropriate progress bar if requested
-        if progress_bar:
-            if notebook:
-                school_id_iterator = tqdm.notebook.tqdm(school_ids)
-            else:
-                school_id_iterator = tqdm.tqdm(school_ids)
-        else:
-            school_id_iterator = school_ids
         # We create two tables from TC's child data: a table of child data and a
-        # one-to-many map of children to parents. 
-        children_dfs = list()
-        children_parents_dfs=list()
+        # one-to-many map of children to parents.
         logger.info('Fetching child data and child-parent mapping from Transparent Classroom for {} schools'.format(
             len(school_ids)
         ))
-        if delay is not None:
-            logger.info('Using delay of {} seconds between requests to avoid rate limit errors from TC API'.format(
-                delay
-            ))
-        for school_id in school_id_iterator:
-            children_school, children_parents_school = self.fetch_child_data_school(
+        results = self.fetch_data_for_ids(
+            fetch_function=lambda school_id: self.fetch_child_data_school(
                 school_id=school_id
-            )
-            children_dfs.append(children_school)
-            children_parents_dfs.append(children_parents_school)
-            # Optional delay to avoid rate limit errors from TC API
-            if delay is not None:
-                time.sleep(delay)
+            ),
+            ids=school_ids,
+            progress_bar=progress_bar,
+            notebook=notebook,
+            delay=delay,
+            requests_per_second=requests_per_second,
+            max_workers=max_workers
+        )
+        children_dfs = [children_school for children_school, _ in results]
+        children_parents_dfs = [children_parents_school for _, children_parents_school in results]
         children = (
             pd.concat(children_dfs)
             .sort_index()
@@ -215,11 +379,28 @@ class TransparentClassroomClient:
         self,
         school_id
     ):
-        children_school_list = self.request(
-            'children.json',
-            params={'session_id': 'all'},
-            school_id=school_id
-        )
+        # The bulk children response has no per-child currency field, so
+        # determining current_child requires a second request with
+        # only_current enabled. The two requests are independent, so issue
+        # them concurrently and overlap their round trips
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+            children_future = executor.submit(
+                self.request,
+                'children.json',
+                params={'session_id': 'all'},
+                school_id=school_id
+            )
+            children_current_future = executor.submit(
+                self.request,
+                'children.json',
+                params={
+                    'session_id': 'all',
+                    'only_current': 'true'
+                },
+                school_id=school_id
+            )
+            children_school_list = children_future.result()
+            children_school_current_list = children_current_future.result()
         if len(children_school_list) == 0:
             logger.warning('School {} has zero children'.format(school_id))
             return pd.DataFrame(), pd.DataFrame()
@@ -255,16 +436,8 @@ class TransparentClassroomClient:
         children_school['last_day'] = children_school['last_day'].apply(utils.to_date)
         children_school['ethnicity'] = children_school['ethnicity'].replace({np.nan: None})
         # For each child, we want to know whether they are current in the TC
-        # system. The only way to do this is to pull again with the only_current
-        # parameter enabled and compare the lists
-        children_school_current_list = self.request(
-            'children.json',
-            params={
-                'session_id': 'all',
-                'only_current': 'true'
-            },
-            school_id=school_id
-        )
+        # system, which we determine by comparing against the only_current
+        # response fetched above
         if len(children_school_current_list) > 0:
             current_child_ids = {current_child['id'] for current_child in children_school_current_list}
             children_school['current_child'] = children_school.index.get_level_values('child_id').isin(current_child_ids)
@@ -302,35 +475,27 @@ class TransparentClassroomClient:
         school_ids=None,
         progress_bar=False,
         notebook=False,
-        delay = None
+        delay=None,
+        requests_per_second=None,
+        max_workers=None
     ):
         # If school IDs are not specified, fetch all school IDs
         if school_ids is None:
             school_ids = self.fetch_school_ids()
-        # Wrap the iterator in the appropriate progress bar if requested
-        if progress_bar:
-            if notebook:
-                school_id_iterator = tqdm.notebook.tqdm(school_ids)
-            else:
-                school_id_iterator = tqdm.tqdm(school_ids)
-        else:
-            school_id_iterator = school_ids
-        users_dfs = list()
         logger.info('Fetching user data from Transparent Classroom for {} schools'.format(
             len(school_ids)
         ))
-        if delay is not None:
-            logger.info('Using delay of {} seconds between requests to avoid rate limit errors from TC API'.format(
-                delay
-            ))
-        for school_id in school_id_iterator:
-            users_school = self.fetch_user_data_school(
+        users_dfs = self.fetch_data_for_ids(
+            fetch_function=lambda school_id: self.fetch_user_data_school(
                 school_id=school_id
-            )
-            users_dfs.append(users_school)
-            # Optional delay to avoid rate limit errors from TC API
-            if delay is not None:
-                time.sleep(delay)
+            ),
+            ids=school_ids,
+            progress_bar=progress_bar,
+            notebook=notebook,
+            delay=delay,
+            requests_per_second=requests_per_second,
+            max_workers=max_workers
+        )
         users = (
             pd.concat(users_dfs)
             .sort_index()
@@ -388,35 +553,27 @@ class TransparentClassroomClient:
         school_ids=None,
         progress_bar=False,
         notebook=False,
-        delay = None
+        delay=None,
+        requests_per_second=None,
+        max_workers=None
     ):
         # If school IDs are not specified, fetch all school IDs
         if school_ids is None:
             school_ids = self.fetch_school_ids()
-        # Wrap the iterator in the appropriate progress bar if requested
-        if progress_bar:
-            if notebook:
-                school_id_iterator = tqdm.notebook.tqdm(school_ids)
-            else:
-                school_id_iterator = tqdm.tqdm(school_ids)
-        else:
-            school_id_iterator = school_ids
-        sessions_dfs = list()
         logger.info('Fetching session data from Transparent Classroom for {} schools'.format(
             len(school_ids)
         ))
-        if delay is not None:
-            logger.info('Using delay of {} seconds between requests to avoid rate limit errors from TC API'.format(
-                delay
-            ))
-        for school_id in school_id_iterator:
-            sessions_school = self.fetch_session_data_school(
+        sessions_dfs = self.fetch_data_for_ids(
+            fetch_function=lambda school_id: self.fetch_session_data_school(
                 school_id=school_id
-            )
-            sessions_dfs.append(sessions_school)
-            # Optional delay to avoid rate limit errors from TC API
-            if delay is not None:
-                time.sleep(delay)
+            ),
+            ids=school_ids,
+            progress_bar=progress_bar,
+            notebook=notebook,
+            delay=delay,
+            requests_per_second=requests_per_second,
+            max_workers=max_workers
+        )
         sessions = (
             pd.concat(sessions_dfs)
             .sort_index()
@@ -466,35 +623,27 @@ class TransparentClassroomClient:
         school_ids=None,
         progress_bar=False,
         notebook=False,
-        delay = None
+        delay=None,
+        requests_per_second=None,
+        max_workers=None
     ):
         # If school IDs are not specified, fetch all school IDs
         if school_ids is None:
             school_ids = self.fetch_school_ids()
-        # Wrap the iterator in the appropriate progress bar if requested
-        if progress_bar:
-            if notebook:
-                school_id_iterator = tqdm.notebook.tqdm(school_ids)
-            else:
-                school_id_iterator = tqdm.tqdm(school_ids)
-        else:
-            school_id_iterator = school_ids
-        classrooms_dfs = list()
         logger.info('Fetching classroom data from Transparent Classroom for {} schools'.format(
             len(school_ids)
         ))
-        if delay is not None:
-            logger.info('Using delay of {} seconds between requests to avoid rate limit errors from TC API'.format(
-                delay
-            ))
-        for school_id in school_id_iterator:
-            classrooms_school = self.fetch_classroom_data_school(
+        classrooms_dfs = self.fetch_data_for_ids(
+            fetch_function=lambda school_id: self.fetch_classroom_data_school(
                 school_id=school_id
-            )
-            classrooms_dfs.append(classrooms_school)
-            # Optional delay to avoid rate limit errors from TC API
-            if delay is not None:
-                time.sleep(delay)
+            ),
+            ids=school_ids,
+            progress_bar=progress_bar,
+            notebook=notebook,
+            delay=delay,
+            requests_per_second=requests_per_second,
+            max_workers=max_workers
+        )
         classrooms = (
             pd.concat(classrooms_dfs)
             .sort_index()